@@ -1,9 +1,14 @@
+import json
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from flask import Flask, g, request, redirect, url_for, flash, render_template_string
+from flask import Flask, request, redirect, url_for, flash, render_template
 import pandas as pd
 import unicodedata
 from jinja2 import DictLoader
+from markupsafe import Markup, escape
 
 # ==========================
 # 基本設定
@@ -17,6 +22,8 @@ CSV_PATHS = [
     DATA_DIR / "keizai_class_complete.csv",
     DATA_DIR / "pankyo_class_complete.csv",
 ]
+CSV_CHUNKSIZE = 50_000  # CSV 読み込み時の 1 チャンクあたりの行数
+PAGE_SIZE = 50          # 講義一覧の 1 ページあたりの件数
 
 app = Flask(__name__)
 app.secret_key = "change-this-in-production"
@@ -28,18 +35,78 @@ def z2h(s: str) -> str:
     """全角→半角 (NFKC) 正規化。None/空はそのまま返す"""
     return unicodedata.normalize("NFKC", s) if s else s
 
-def get_db():
-    DATA_DIR.mkdir(exist_ok=True)
-    if "db" not in g:
-        g.db = sqlite3.connect(str(DB_PATH))
-        g.db.row_factory = sqlite3.Row
-    return g.db
+# 接続はリクエストごとに開かず、プロセス内で使い回す（初回利用時に開く）
+#   読み取り: 読み取り専用の共有接続（ページキャッシュを温かいまま保つ）
+#   書き込み: 専用接続 1 本をロックで直列化
+# SQLite の接続は fork をまたいで使えないため、開いたプロセスの PID と組で持ち、
+# PID が変わったら（gunicorn --preload 等で fork された子プロセスでは）開き直す
+_CONNS = {}          # 種別 -> (pid, 接続)
+_FORKED_CONNS = []   # 親から引き継いだ接続。子で閉じると親の DB を壊しうるので参照だけ残す
+_OPEN_LOCK = threading.Lock()
+_WRITE_LOCK = threading.Lock()
+
+def open_write_db():
+    db = sqlite3.connect(str(DB_PATH), check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    return db
+
+def open_read_db():
+    db = sqlite3.connect(DB_PATH.as_uri() + "?mode=ro", uri=True, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute("PRAGMA query_only=1")
+    return db
+
+def _get_conn(kind, opener):
+    pid = os.getpid()
+    entry = _CONNS.get(kind)
+    if entry is None or entry[0] != pid:
+        with _OPEN_LOCK:
+            entry = _CONNS.get(kind)
+            if entry is None or entry[0] != pid:
+                if entry is not None:
+                    _FORKED_CONNS.append(entry[1])
+                entry = _CONNS[kind] = (pid, opener())
+    return entry[1]
 
-@app.teardown_appcontext
-def close_db(exception):
-    db = g.pop("db", None)
-    if db is not None:
-        db.close()
+def get_db():
+    """読み取り用の共有接続を返す"""
+    return _get_conn("read", open_read_db)
+
+def get_write_db():
+    """書き込み用の接続を返す（通常は write_db() 経由で使う）"""
+    return _get_conn("write", open_write_db)
+
+@contextmanager
+def write_db():
+    """書き込み用接続をロック付きで貸し出す。抜けるときにコミット（例外時はロールバック）"""
+    with _WRITE_LOCK:
+        db = get_write_db()
+        with db:
+            yield db
+
+def close_dbs():
+    """このプロセスで開いた接続を閉じる"""
+    with _OPEN_LOCK:
+        for pid, db in _CONNS.values():
+            if pid == os.getpid():
+                db.close()
+        _CONNS.clear()
+
+# プルダウン選択肢のキャッシュ（courses は初期投入時にしか変わらない）
+_FACULTIES_CACHE = None
+_TERMS_CACHE = None
+
+def get_faculties(db):
+    global _FACULTIES_CACHE
+    if _FACULTIES_CACHE is None:
+        _FACULTIES_CACHE = [r[0] for r in db.execute("SELECT DISTINCT 開講学部 FROM courses WHERE 開講学部 <> '' ORDER BY 開講学部").fetchall()]
+    return _FACULTIES_CACHE
+
+def get_terms(db):
+    global _TERMS_CACHE
+    if _TERMS_CACHE is None:
+        _TERMS_CACHE = [r[0] for r in db.execute("SELECT DISTINCT 開講時期 FROM courses WHERE 開講時期 <> '' ORDER BY 開講時期").fetchall()]
+    return _TERMS_CACHE
 
 # ==========================
 # スキーマ
@@ -66,47 +133,166 @@ CREATE TABLE IF NOT EXISTS favorites (
 CREATE INDEX IF NOT EXISTS idx_courses_fac ON courses(開講学部);
 CREATE INDEX IF NOT EXISTS idx_courses_term ON courses(開講時期);
 CREATE INDEX IF NOT EXISTS idx_courses_slot ON courses(曜日時限);
+-- 講義一覧の並び順（index() の ORDER BY の一時ソートを省く）
+CREATE INDEX IF NOT EXISTS idx_courses_sort ON courses(開講学部, 開講時期, 曜日時限, 講義名);
 """
 
+# キーワード検索用 FTS5（courses を content とする外部コンテンツ表）とその同期トリガ。
+# 日本語は空白で区切られないため trigram で部分一致を索引化する。
+# 索引の再構築と同じトランザクションで作れるよう、executescript ではなく 1 文ずつ execute する
+FTS_SCHEMA_STATEMENTS = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS courses_fts USING fts5(
+        講義名, 担当教員, 評価方法,
+        content='courses', content_rowid='id', tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS courses_ai AFTER INSERT ON courses BEGIN
+        INSERT INTO courses_fts(rowid, 講義名, 担当教員, 評価方法)
+        VALUES (new.id, new.講義名, new.担当教員, new.評価方法);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS courses_ad AFTER DELETE ON courses BEGIN
+        INSERT INTO courses_fts(courses_fts, rowid, 講義名, 担当教員, 評価方法)
+        VALUES ('delete', old.id, old.講義名, old.担当教員, old.評価方法);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS courses_au AFTER UPDATE ON courses BEGIN
+        INSERT INTO courses_fts(courses_fts, rowid, 講義名, 担当教員, 評価方法)
+        VALUES ('delete', old.id, old.講義名, old.担当教員, old.評価方法);
+        INSERT INTO courses_fts(rowid, 講義名, 担当教員, 評価方法)
+        VALUES (new.id, new.講義名, new.担当教員, new.評価方法);
+    END
+    """,
+)
+
+# 曜日時限（例: 水曜3限）の先頭の曜日を取り出した生成列。既存 DB にも後付けできるよう ALTER で追加する
+# 従来の「曜日時限 LIKE '水%'」と同じく、先頭が「X曜」の値だけを対象にする
+WEEKDAY_COLUMN_SQL = """
+ALTER TABLE courses ADD COLUMN 曜日 TEXT GENERATED ALWAYS AS (
+    CASE WHEN instr(曜日時限, '曜') = 2 THEN substr(曜日時限, 1, 1) END
+) VIRTUAL
+"""
+
+# trigram は3文字未満の語を索引できないため、それより短い語は LIKE で探す
+FTS_MIN_LEN = 3
+
+def fts_phrase(s: str) -> str:
+    """FTS5 の MATCH 用にフレーズとしてクォートする"""
+    return '"' + s.replace('"', '""') + '"'
+
+def like_escape(s: str) -> str:
+    """LIKE ... ESCAPE '\\' 用に % と _ をエスケープする（FTS 側と同じく文字どおり一致させる）"""
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
 # ==========================
 # CSV → DB 初期投入
 # ==========================
 def init_db_and_seed():
-    db = get_db()
+    db = get_write_db()
     db.executescript(SCHEMA_SQL)
 
+    # 曜日列と索引（未追加の DB のみ ALTER）
+    if "曜日" not in {r[1] for r in db.execute("PRAGMA table_xinfo(courses)")}:
+        db.execute(WEEKDAY_COLUMN_SQL)
+    db.execute("CREATE INDEX IF NOT EXISTS idx_courses_day ON courses(曜日)")
+
+    # 一括投入向けの設定（WAL は DB ファイルに保存され、以降の読み書きも並行可能になる）
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    db.execute("PRAGMA temp_store=MEMORY")
+    db.execute("PRAGMA cache_size=-20000")
+
     required = ["講義名", "時間割コード", "開講時期", "担当教員", "開講学部", "曜日時限", "評価方法"]
 
-    for path in CSV_PATHS:
-        if not path.exists():
-            print(f"[WARN] CSVが見つかりません: {path}")
-            continue
-        try:
-            df = pd.read_csv(path, encoding="utf-8")
-        except UnicodeDecodeError:
-            df = pd.read_csv(path, encoding="utf-8-sig")
-
-        # 必要列の補完と順序調整
-        for col in required:
-            if col not in df.columns:
-                df[col] = ""
-        df = df[required]
-
-        # 全角→半角など軽く正規化
-        for col in ["講義名", "担当教員", "開講学部", "開講時期", "曜日時限", "評価方法"]:
-            df[col] = df[col].astype(str).map(z2h)
-
-        # 挿入（時間割コードのユニーク制約で重複は無視）
-        db.executemany(
+    # 1 ファイルずつではなくチャンク単位で読み込み、全体を 1 トランザクションで投入
+    with db:
+        db.execute("BEGIN IMMEDIATE")
+
+        # 時間割コードが NULL の行はユニーク制約が効かないため、残りの列を自然キーにして
+        # 再投入のたびに同じ行が増えないようにする（索引がない DB は先に重複を除く）
+        nocode_cols = ["講義名", "開講時期", "担当教員", "開講学部", "曜日時限", "評価方法"]
+        nocode_key = ", ".join(nocode_cols)
+        if db.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_courses_nocode'").fetchone() is None:
+            dup_ids = f"""
+                SELECT id FROM courses
+                WHERE 時間割コード IS NULL AND id NOT IN (
+                    SELECT MIN(id) FROM courses WHERE 時間割コード IS NULL GROUP BY {nocode_key}
+                )
             """
-            INSERT OR IGNORE INTO courses
-            (講義名,時間割コード,開講時期,担当教員,開講学部,曜日時限,評価方法)
-            VALUES (?,?,?,?,?,?,?)
-            """,
-            df.values.tolist(),
-        )
-
-    db.commit()
+            same_key = " AND ".join(f"k.{c} IS d.{c}" for c in nocode_cols)
+            # 重複側に付いたお気に入りは残す行（最小 id）へ付け替え、
+            # 残す行が既にお気に入り済みで付け替えられなかった分だけ消す
+            db.execute(f"""
+                UPDATE OR IGNORE favorites SET course_id = (
+                    SELECT MIN(k.id) FROM courses d
+                    JOIN courses k ON k.時間割コード IS NULL AND {same_key}
+                    WHERE d.id = favorites.course_id
+                )
+                WHERE course_id IN ({dup_ids})
+            """)
+            db.execute(f"DELETE FROM favorites WHERE course_id IN ({dup_ids})")
+            db.execute(f"DELETE FROM courses WHERE id IN ({dup_ids})")
+            db.execute(f"CREATE UNIQUE INDEX idx_courses_nocode ON courses({nocode_key}) WHERE 時間割コード IS NULL")
+
+        # FTS 表とトリガは投入・再構築と同じトランザクションで作る
+        # （途中で失敗しても「表はあるが索引が空」の状態を残さない）
+        for stmt in FTS_SCHEMA_STATEMENTS:
+            db.execute(stmt)
+
+        for path in CSV_PATHS:
+            if not path.exists():
+                print(f"[WARN] CSVが見つかりません: {path}")
+                continue
+            # utf-8-sig は BOM の有無どちらの UTF-8 も読める
+            # 必要列だけを文字列として読む（型推論なし、空欄は NaN ではなく ""）
+            reader = pd.read_csv(
+                path,
+                encoding="utf-8-sig",
+                usecols=lambda c: c in required,
+                dtype=str,
+                engine="c",
+                keep_default_na=False,
+                chunksize=CSV_CHUNKSIZE,
+            )
+            for df in reader:
+                # 必要列の補完と順序調整
+                df = df.reindex(columns=required, fill_value="")
+                # 時間割コードが空の行は NULL にしてユニーク制約で潰されないようにする
+                df["時間割コード"] = df["時間割コード"].replace("", None)
+
+                # 全角→半角など軽く正規化（z2h と同じ NFKC をベクトル化して適用）
+                for col in ["講義名", "担当教員", "開講学部", "開講時期", "曜日時限", "評価方法"]:
+                    df[col] = df[col].str.normalize("NFKC")
+
+                # 挿入（時間割コードのユニーク制約で重複は無視）
+                db.executemany(
+                    """
+                    INSERT OR IGNORE INTO courses
+                    (講義名,時間割コード,開講時期,担当教員,開講学部,曜日時限,評価方法)
+                    VALUES (?,?,?,?,?,?,?)
+                    """,
+                    df.itertuples(index=False, name=None),
+                )
+
+        # 索引済みの行数が courses と食い違うときだけ作り直す
+        # （FTS 表を作る前からあった行の取り込みと、過去の失敗で欠けた索引の修復を兼ねる）
+        indexed = db.execute("SELECT COUNT(*) FROM courses_fts_docsize").fetchone()[0]
+        if indexed != db.execute("SELECT COUNT(*) FROM courses").fetchone()[0]:
+            db.execute("INSERT INTO courses_fts(courses_fts) VALUES('rebuild')")
+
+    # 列の分布を sqlite_stat1 に記録し、プランナが索引を選べるようにする
+    db.execute("ANALYZE")
+
+    # courses が変わったのでプルダウン選択肢を作り直す
+    global _FACULTIES_CACHE, _TERMS_CACHE
+    _FACULTIES_CACHE = None
+    _TERMS_CACHE = None
+    get_faculties(db)
+    get_terms(db)
 
 # ==========================
 # テンプレート
@@ -143,11 +329,13 @@ BASE_HTML = """
     </nav>
 
     <main class="container container-narrow my-4">
-      {% with messages = get_flashed_messages() %}
-        {% if messages %}
-          <div class="alert alert-info">{{ messages[0] }}</div>
-        {% endif %}
-      {% endwith %}
+      {% if session.get('_flashes') %}
+        {% with messages = get_flashed_messages() %}
+          {% if messages %}
+            <div class="alert alert-info">{{ messages[0] }}</div>
+          {% endif %}
+        {% endwith %}
+      {% endif %}
       {% block content %}{% endblock %}
     </main>
 
@@ -226,32 +414,24 @@ INDEX_HTML = """
     </div>
 
     {% if courses %}
-      {% for c in courses %}
-        <div class="card p-3 mb-3">
-          <div class="d-flex justify-content-between align-items-start flex-wrap gap-2">
-            <div>
-              <h6 class="mb-1">{{ c['講義名'] }} <span class="muted">（{{ c['時間割コード'] }}）</span></h6>
-              <div class="small muted">{{ c['担当教員'] }} / {{ c['開講学部'] }} / {{ c['開講時期'] }} / {{ c['曜日時限'] or '—' }}</div>
-              {% if c['評価方法'] %}<div class="mt-1"><span class="chip">評価: {{ c['評価方法'] }}</span></div>{% endif %}
-            </div>
-            <div class="d-flex align-items-center gap-2">
-              <div class="form-check">
-                <input class="form-check-input" type="checkbox" value="{{ c['id'] }}" id="chk{{ c['id'] }}">
-                <label class="form-check-label" for="chk{{ c['id'] }}">選択</label>
-              </div>
-              {% if c['is_fav'] %}
-                <form method="post" action="{{ url_for('unfavorite', course_id=c['id']) }}">
-                  <button class="btn btn-outline-secondary btn-sm btn-rounded" type="submit">マイページから外す</button>
-                </form>
-              {% else %}
-                <form method="post" action="{{ url_for('favorite', course_id=c['id']) }}">
-                  <button class="btn btn-primary btn-sm btn-rounded" type="submit">マイページに追加</button>
-                </form>
-              {% endif %}
-            </div>
-          </div>
-        </div>
-      {% endfor %}
+      {{ courses_html }}
+
+      {% if pages > 1 %}
+        {% set args = request.args.to_dict() %}
+        <nav class="d-flex justify-content-between align-items-center">
+          {% if page > 1 %}
+            <a class="btn btn-outline-secondary btn-sm btn-rounded" href="{{ url_for('index', **dict(args, page=page-1)) }}">前へ</a>
+          {% else %}
+            <span></span>
+          {% endif %}
+          <span class="small muted">{{ page }} / {{ pages }} ページ</span>
+          {% if page < pages %}
+            <a class="btn btn-outline-secondary btn-sm btn-rounded" href="{{ url_for('index', **dict(args, page=page+1)) }}">次へ</a>
+          {% else %}
+            <span></span>
+          {% endif %}
+        </nav>
+      {% endif %}
     {% else %}
       <div class="alert alert-light border">一致する講義がありませんでした。</div>
     {% endif %}
@@ -298,14 +478,65 @@ MYPAGE_HTML = """
 {% endblock %}
 """
 
+# 講義一覧のカードは Jinja のループではなく Python 側で組み立てる
+# （値は escape() してから str.format に渡すこと）
+INDEX_CARD_HTML = """
+        <div class="card p-3 mb-3">
+          <div class="d-flex justify-content-between align-items-start flex-wrap gap-2">
+            <div>
+              <h6 class="mb-1">{name} <span class="muted">（{code}）</span></h6>
+              <div class="small muted">{teacher} / {faculty} / {term} / {slot}</div>
+              {chip}
+            </div>
+            <div class="d-flex align-items-center gap-2">
+              <div class="form-check">
+                <input class="form-check-input" type="checkbox" value="{id}" id="chk{id}">
+                <label class="form-check-label" for="chk{id}">選択</label>
+              </div>
+              {fav_form}
+            </div>
+          </div>
+        </div>
+"""
+
+INDEX_CHIP_HTML = """<div class="mt-1"><span class="chip">評価: {}</span></div>"""
+
+FAV_FORM_HTML = """
+                <form method="post" action="{}">
+                  <button class="btn btn-primary btn-sm btn-rounded" type="submit">マイページに追加</button>
+                </form>
+"""
+
+UNFAV_FORM_HTML = """
+                <form method="post" action="{}">
+                  <button class="btn btn-outline-secondary btn-sm btn-rounded" type="submit">マイページから外す</button>
+                </form>
+"""
+
+def render_course_cards(rows):
+    """講義一覧のカード HTML をまとめて生成する"""
+    # url_for は行ごとに呼ばず、末尾の講義 ID を差し替えて使う
+    fav_prefix = escape(url_for("favorite", course_id=0)[:-1])
+    unfav_prefix = escape(url_for("unfavorite", course_id=0)[:-1])
+    return Markup("".join(
+        INDEX_CARD_HTML.format(
+            id=c["id"],
+            name=escape(c["講義名"]),
+            code=escape(c["時間割コード"]),
+            teacher=escape(c["担当教員"]),
+            faculty=escape(c["開講学部"]),
+            term=escape(c["開講時期"]),
+            slot=escape(c["曜日時限"] or "—"),
+            chip=INDEX_CHIP_HTML.format(escape(c["評価方法"])) if c["評価方法"] else "",
+            fav_form=(UNFAV_FORM_HTML.format(f"{unfav_prefix}{c['id']}") if c["is_fav"]
+                      else FAV_FORM_HTML.format(f"{fav_prefix}{c['id']}")),
+        )
+        for c in rows
+    ))
+
 # ==========================
 # ルーティング
 # ==========================
-@app.before_request
-def _before():
-    # 毎リクエストでスキーマは確実に存在させる（typo修正：executescript）
-    get_db().executescript(SCHEMA_SQL)
-
 @app.route("/")
 def index():
     db = get_db()
@@ -322,14 +553,12 @@ def index():
         period = period[:-1]
     period = period.replace("－","-").replace("—","-").replace("–","-")
 
+    page = max(1, request.args.get("page", 1, type=int))
+
     where = []
     params = []
 
-    if q:
-        like = f"%{q}%"
-        where.append("(講義名 LIKE ? OR 担当教員 LIKE ? OR 評価方法 LIKE ?)")
-        params += [like, like, like]
-
+    # 絞り込みの強い等値条件から順に並べ、キーワード条件は最後に置く
     if faculty:
         where.append("開講学部 = ?")
         params.append(faculty)
@@ -338,51 +567,65 @@ def index():
         where.append("開講時期 = ?")
         params.append(term)
 
-    # 曜日（先頭一致）／時限（部分一致）／両方（AND）
+    # 曜日（生成列で等値一致＝先頭一致と同じ）／時限（部分一致）／両方（AND）
     if weekday:
-        where.append("曜日時限 LIKE ?")
-        params.append(f"{weekday}%")
+        where.append("曜日 = ?")
+        params.append(weekday)
 
     if period:
         where.append("曜日時限 LIKE ?")
         params.append(f"%{period}%")
 
-    sql = "SELECT * FROM courses"
-    if where:
-        sql += " WHERE " + " AND ".join(where)
-    sql += " ORDER BY 開講学部, 開講時期, 曜日時限, 講義名"
+    # キーワード（FTS / 短い語は LIKE）
+    if q and len(q) >= FTS_MIN_LEN:
+        where.append("c.id IN (SELECT rowid FROM courses_fts WHERE courses_fts MATCH ?)")
+        params.append(fts_phrase(q))
+    elif q:
+        like = f"%{like_escape(q)}%"
+        where.append("(講義名 LIKE ? ESCAPE '\\' OR 担当教員 LIKE ? ESCAPE '\\' OR 評価方法 LIKE ? ESCAPE '\\')")
+        params += [like, like, like]
+
+    where_sql = " WHERE " + " AND ".join(where) if where else ""
+
+    # 件数は同じ条件で COUNT(*) のみ数える
+    total = db.execute("SELECT COUNT(*) FROM courses c" + where_sql, params).fetchone()[0]
+    pages = max(1, -(-total // PAGE_SIZE))
+    page = min(page, pages)
 
-    courses = list(db.execute(sql, params).fetchall())
+    # お気に入り判定は LEFT JOIN で SQL 側に任せる（表示するのは 1 ページ分のみ）
+    sql = """
+        SELECT c.*, (f.course_id IS NOT NULL) AS is_fav
+        FROM courses c
+        LEFT JOIN favorites f ON f.course_id = c.id
+    """
+    sql += where_sql
+    sql += " ORDER BY 開講学部, 開講時期, 曜日時限, 講義名 LIMIT ? OFFSET ?"
 
-    # お気に入り判定を付与
-    fav_ids = {r[0] for r in db.execute("SELECT course_id FROM favorites").fetchall()}
-    enriched = []
-    for c in courses:
-        d = dict(c)
-        d["is_fav"] = c["id"] in fav_ids
-        enriched.append(d)
+    courses = db.execute(sql, params + [PAGE_SIZE, (page - 1) * PAGE_SIZE]).fetchall()
 
     # プルダウン選択肢
-    faculties = [r[0] for r in db.execute("SELECT DISTINCT 開講学部 FROM courses WHERE 開講学部 <> '' ORDER BY 開講学部").fetchall()]
-    terms     = [r[0] for r in db.execute("SELECT DISTINCT 開講時期 FROM courses WHERE 開講時期 <> '' ORDER BY 開講時期").fetchall()]
+    faculties = get_faculties(db)
+    terms     = get_terms(db)
 
-    return render_template_string(
-        INDEX_HTML,
+    return render_template(
+        "index.html",
         title=f"{APP_TITLE}｜講義一覧",
         app_title=APP_TITLE,
         active="index",
-        courses=enriched,
+        courses=courses,
+        courses_html=render_course_cards(courses),
         faculties=faculties,
         terms=terms,
-        total=len(enriched),
+        total=total,
+        page=page,
+        pages=pages,
     )
 
 @app.route("/favorite/<int:course_id>", methods=["POST"])
 def favorite(course_id):
-    db = get_db()
     try:
-        db.execute("INSERT OR IGNORE INTO favorites(course_id) VALUES (?)", (course_id,))
-        db.commit()
+        with write_db() as db:
+            db.execute("INSERT OR IGNORE INTO favorites(course_id) VALUES (?)", (course_id,))
         flash("マイページに追加しました。")
     except Exception as e:
         flash(f"追加に失敗しました: {e}")
@@ -390,9 +633,8 @@ def favorite(course_id):
 
 @app.route("/unfavorite/<int:course_id>", methods=["POST"])
 def unfavorite(course_id):
-    db = get_db()
-    db.execute("DELETE FROM favorites WHERE course_id=?", (course_id,))
-    db.commit()
+    with write_db() as db:
+        db.execute("DELETE FROM favorites WHERE course_id=?", (course_id,))
     flash("マイページから外しました。")
     return redirect(request.referrer or url_for("mypage"))
 
@@ -402,11 +644,14 @@ def bulk_fav():
     if not ids:
         flash("講義が選択されていません。")
         return redirect(url_for("index"))
-    id_list = [int(x) for x in ids.split(",") if x.isdigit()]
-    db = get_db()
-    db.executemany("INSERT OR IGNORE INTO favorites(course_id) VALUES (?)", [(i,) for i in id_list])
-    db.commit()
-    flash(f"{len(id_list)}件をマイページに追加しました。")
+    # 重複を除き、json_each で 1 文にまとめて挿入
+    id_set = {int(x) for x in ids.split(",") if x.isdigit()}
+    with write_db() as db:
+        db.execute(
+            "INSERT OR IGNORE INTO favorites(course_id) SELECT value FROM json_each(?)",
+            (json.dumps(list(id_set)),),
+        )
+    flash(f"{len(id_set)}件をマイページに追加しました。")
     return redirect(url_for("mypage"))
 
 @app.route("/mypage")
@@ -419,8 +664,8 @@ def mypage():
         ORDER BY 開講学部, 開講時期, 曜日時限, 講義名
         """
     ).fetchall()
-    return render_template_string(
-        MYPAGE_HTML,
+    return render_template(
+        "mypage.html",
         title=f"{APP_TITLE}｜マイページ",
         app_title=APP_TITLE,
         active="mypage",
@@ -430,9 +675,8 @@ def mypage():
 
 @app.route("/clear-favs", methods=["POST"])
 def clear_favs():
-    db = get_db()
-    db.execute("DELETE FROM favorites")
-    db.commit()
+    with write_db() as db:
+        db.execute("DELETE FROM favorites")
     flash("マイページを空にしました。")
     return redirect(url_for("mypage"))
 
@@ -445,13 +689,28 @@ app.jinja_loader = DictLoader({
     "mypage.html": MYPAGE_HTML,
 })
 
+# ==========================
+# 初期化（スキーマ作成と CSV 投入はプロセスにつき 1 回）
+# ==========================
+_INITIALIZED = False
+
+def _init_once():
+    global _INITIALIZED
+    if _INITIALIZED:
+        return
+    DATA_DIR.mkdir(exist_ok=True)
+    init_db_and_seed()
+    # import 時に開いた接続は閉じておき、fork 後の各プロセスが初回リクエストで自分の接続を開く
+    close_dbs()
+    _INITIALIZED = True
+
+# gunicorn 等から import された場合も初期化されるよう import 時に実行
+_init_once()
+
 # ==========================
 # 起動
 # ==========================
 if __name__ == "__main__":
-    DATA_DIR.mkdir(exist_ok=True)
-    with app.app_context():
-        init_db_and_seed()
     print("== 起動 ==>")
     print("http://127.0.0.1:5000")
     app.run(debug=True)
\ No newline at end of file